@@ -0,0 +1,10 @@
+from __future__ import annotations
+import time
+
+
+_time_ns = time.time_ns
+
+
+def now_ms() -> int:
+    # Integer-only: no float multiply/round-trip on this per-event call.
+    return _time_ns() // 1_000_000
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import hashlib
-from fastapi import FastAPI, WebSocket
+from typing import Callable
+from fastapi import FastAPI, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from .settings import settings
 from .schemas import (
@@ -21,9 +24,9 @@ from .schemas import (
 from .store import AppStore
 from .ws import WSManager
 from .recorder.playwright_agent import PlaywrightAgent
-from .recorder.sanitize import safe_host, safe_path, scrub_text
+from .recorder.sanitize import safe_host, safe_host_path, scrub_text
 
-app = FastAPI(title="ThirdLayer Sample Backend", version="0.1.0")
+app = FastAPI(title="ThirdLayer Sample Backend", version="0.1.0", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,98 +40,120 @@ store = AppStore(max_events=settings.max_events)
 ws_mgr = WSManager()
 
 
+@functools.lru_cache(maxsize=2048)
+def _state_sig(testids: tuple[str, ...]) -> str:
+    return scrub_text("|".join(testids), max_len=500)
+
+
+@functools.lru_cache(maxsize=2048)
+def _sig_hash(sig: str) -> str:
+    """Short stable hash of an already-scrubbed STATE signature.
+
+    Consecutive snapshots often repeat, and the sig is usually the very string
+    object cached by _state_sig, so a hit costs one dict lookup.
+    """
+    return hashlib.sha1(sig.encode("utf-8")).hexdigest()[:10] if sig else "empty"
+
+
+def _s(payload: dict, key: str, max_len: int = 64) -> str:
+    """Scrubbed string value of payload[key]; empty values skip scrubbing."""
+    v = payload.get(key)
+    return scrub_text(str(v), max_len=max_len) if v else ""
+
+
+def _id_click(host: str, path: str, payload: dict) -> str:
+    # Prefer stable semantic keys over CSS selectors.
+    if payload.get("testid"):
+        key = f"testid={payload.get('testid')}"
+    elif payload.get("ariaLabel"):
+        key = f"aria={payload.get('ariaLabel')}"
+    elif payload.get("id"):
+        key = f"id={payload.get('id')}"
+    else:
+        key = f"sel={payload.get('selector') or ''}"
+
+    key = scrub_text(key, max_len=160)
+    return f"CLICK:{host}{path}:{key}"
+
+
+def _id_state(host: str, path: str, payload: dict) -> str:
+    # Stable state identity derived from currently-visible semantic affordances.
+    sig = payload.get("sig")
+    if sig:
+        # event_to_action stores the scrubbed sig from _state_sig.
+        sig = str(sig)
+    else:
+        testids = payload.get("testids") or []
+        sig = _state_sig(tuple(str(t) for t in testids)) if isinstance(testids, list) else ""
+    return f"STATE:{host}{path}:{_sig_hash(sig)}"
+
+
+_ID_HANDLERS: dict[str, Callable[[str, str, dict], str]] = {
+    "CLICK": _id_click,
+    "SHORTCUT": lambda host, path, payload: f"SHORTCUT:{_s(payload, 'combo', 80)}",
+    "KEYBOARD": lambda host, path, payload: f"KEY:{_s(payload, 'key', 40)}",
+    "NAV": lambda host, path, payload: f"NAV:{host}{path}",
+    "TAB": lambda host, path, payload: f"TAB:{host}{path}",
+    "DOM": lambda host, path, payload: f"DOM:{host}{path}",
+    "STATE": _id_state,
+}
+
+
 def action_id_for(kind: str, host: str, path: str, payload: dict) -> str:
     """Return a stable node id for graph merging.
 
     Important: CLICK nodes should be keyed by semantic identity first
     (testid / aria-label / id) and only fall back to selectors.
     """
-    if kind == "CLICK":
-        # Prefer stable semantic keys over CSS selectors.
-        if payload.get("testid"):
-            key = f"testid={payload.get('testid')}"
-        elif payload.get("ariaLabel"):
-            key = f"aria={payload.get('ariaLabel')}"
-        elif payload.get("id"):
-            key = f"id={payload.get('id')}"
-        else:
-            key = f"sel={payload.get('selector') or ''}"
-
-        key = scrub_text(str(key), max_len=160)
-        return f"CLICK:{host}{path}:{key}"
-
-    if kind == "SHORTCUT":
-        combo = scrub_text(str(payload.get("combo") or ""), max_len=80)
-        return f"SHORTCUT:{combo}"
-
-    if kind == "KEYBOARD":
-        key = scrub_text(str(payload.get("key") or ""), max_len=40)
-        return f"KEY:{key}"
-
-    if kind == "NAV":
-        return f"NAV:{host}{path}"
-
-    if kind == "TAB":
-        return f"TAB:{host}{path}"
-
-    if kind == "DOM":
-        return f"DOM:{host}{path}"
-
-    if kind == "STATE":
-        # Stable state identity derived from currently-visible semantic affordances.
-        sig = payload.get("sig")
-        if not sig:
-            testids = payload.get("testids") or []
-            if isinstance(testids, list):
-                sig = "|".join([str(t) for t in testids])
-            else:
-                sig = ""
-        sig = scrub_text(str(sig), max_len=500)
-        h = hashlib.sha1(sig.encode("utf-8")).hexdigest()[:10] if sig else "empty"
-        return f"STATE:{host}{path}:{h}"
-
-    return f"OTHER:{host}{path}:{kind}"
+    handler = _ID_HANDLERS.get(kind)
+    if handler is None:
+        return f"OTHER:{host}{path}:{kind}"
+    return handler(host, path, payload)
+
+
+def _label_click(host: str, path: str, payload: dict) -> str:
+    role = _s(payload, "tag", 12)
+    bits = [b for b in (_s(payload, "ariaLabel"), _s(payload, "testid"), _s(payload, "id")) if b]
+    if bits:
+        hint = " / ".join(bits)
+    else:
+        hint = _s(payload, "selector", 90) or "(unknown element)"
+    return f"Click [{role}] {hint}\n{host}{path}"
+
+
+def _label_state(host: str, path: str, payload: dict) -> str:
+    testids = payload.get("testids") or []
+    if isinstance(testids, list) and len(testids) > 0:
+        shown = [scrub_text(str(t), max_len=28) for t in testids[:4]]
+        preview = ", ".join(shown)
+        if len(testids) > 4:
+            preview += f" +{len(testids) - 4}"
+    else:
+        preview = _s(payload, "sig", 80) or "(no testids)"
+    return f"State\n{preview}\n{host}{path}"
+
+
+_LABEL_HANDLERS: dict[str, Callable[[str, str, dict], str]] = {
+    "CLICK": _label_click,
+    "SHORTCUT": lambda host, path, payload: f"Shortcut {payload.get('combo')}\n{host}{path}",
+    "KEYBOARD": lambda host, path, payload: f"Keyboard {_s(payload, 'key', 40)}\n{host}{path}",
+    "NAV": lambda host, path, payload: f"Navigate\n{host}{path}",
+    "TAB": lambda host, path, payload: f"Tab\n{host}{path}",
+    "DOM": lambda host, path, payload: f"DOM change\n{host}{path}",
+    "STATE": _label_state,
+}
 
 
 def label_for_action(kind: str, host: str, path: str, payload: dict) -> str:
-    if kind == "CLICK":
-        role = scrub_text(str(payload.get("tag") or ""), max_len=12)
-        a = scrub_text(str(payload.get("ariaLabel") or ""))
-        t = scrub_text(str(payload.get("testid") or ""))
-        i = scrub_text(str(payload.get("id") or ""))
-        bits = [b for b in [a, t, i] if b]
-        selector = scrub_text(str(payload.get("selector") or ""), max_len=90)
-        hint = " / ".join(bits) if bits else (selector or "(unknown element)")
-        return f"Click [{role}] {hint}\n{host}{path}"
-    if kind == "SHORTCUT":
-        return f"Shortcut {payload.get('combo')}\n{host}{path}"
-    if kind == "KEYBOARD":
-        k = scrub_text(str(payload.get("key") or ""), max_len=40)
-        return f"Keyboard {k}\n{host}{path}"
-    if kind == "NAV":
-        return f"Navigate\n{host}{path}"
-    if kind == "TAB":
-        return f"Tab\n{host}{path}"
-    if kind == "DOM":
-        return f"DOM change\n{host}{path}"
-    if kind == "STATE":
-        testids = payload.get("testids") or []
-        preview = ""
-        if isinstance(testids, list) and len(testids) > 0:
-            shown = [scrub_text(str(t), max_len=28) for t in testids[:4]]
-            preview = ", ".join(shown)
-            if len(testids) > 4:
-                preview += f" +{len(testids) - 4}"
-        else:
-            preview = scrub_text(str(payload.get("sig") or ""), max_len=80) or "(no testids)"
-        return f"State\n{preview}\n{host}{path}"
-    return f"{kind}\n{host}{path}"
+    handler = _LABEL_HANDLERS.get(kind)
+    if handler is None:
+        return f"{kind}\n{host}{path}"
+    return handler(host, path, payload)
 
 
 def event_to_action(ev: RawEvent) -> Action:
     url = ev.url or ev.payload.get("url") or ev.payload.get("to") or ""
-    host = safe_host(url)
-    path = safe_path(url)
+    host, path = safe_host_path(url)
 
     # normalize event -> action kind
     if ev.type == "POINTER_DOWN":
@@ -161,11 +186,10 @@ def event_to_action(ev: RawEvent) -> Action:
         raw = ev.payload.get("testids") or []
         testids = [str(t) for t in raw] if isinstance(raw, list) else []
         testids = sorted(set(testids))
-        sig = "|".join(testids)
         payload = {
             "reason": ev.payload.get("reason"),
             "testids": testids,
-            "sig": scrub_text(sig, max_len=500),
+            "sig": _state_sig(tuple(testids)),
             "n": len(testids),
         }
     else:
@@ -175,10 +199,11 @@ def event_to_action(ev: RawEvent) -> Action:
     aid = action_id_for(kind, host, path, payload)
     label = label_for_action(kind, host, path, payload)
 
-    return Action(
+    # Fields are derived from an already-validated event: skip re-validation.
+    return Action.model_construct(
         id=aid,
         ts=ev.ts,
-        kind=kind,  # type: ignore
+        kind=kind,
         url=url,
         host=host,
         path=path,
@@ -198,17 +223,17 @@ async def on_event(ev: RawEvent) -> None:
     # (good enough for MVP; replace with real procedure mining later)
     last = await store.get_last_action_id()
     if last:
-        store.memory.upsert(
+        store.memory.stage(
             item_id=f"hint:{store.session_id or 'nosess'}:{last}",
             title="Recent step",
             text=act.label,
             tags=[act.host],
         )
 
-    await ws_mgr.broadcast_json({"type": "event", "event": ev.model_dump()})
+    ws_mgr.enqueue_json({"type": "event", "event": ev.model_dump()})
     # periodic graph snapshots are handled client-side by polling endpoint,
     # but we can also push a lightweight hint:
-    await ws_mgr.broadcast_json({"type": "action", "action": act.model_dump()})
+    ws_mgr.enqueue_json({"type": "action", "action": act.model_dump()})
 
 
 @app.get("/api/state", response_model=StateResponse)
@@ -216,8 +241,6 @@ async def get_state():
     return StateResponse(recording=store.recording, session_id=store.session_id, allowed_hosts=settings.allowed_hosts)
 
 
-from fastapi import HTTPException
-
 @app.post("/api/session/start", response_model=StartSessionResponse)
 async def start_session(req: StartSessionRequest):
     if store.recording:
@@ -286,7 +309,7 @@ async def predict():
     ctx = await store.get_last_state_id() or await store.get_last_workflow_action_id()
     ctx_meta = await store.get_node_meta(ctx) if ctx else None
     preds = await store.predict_next(k=5)
-    return PredictResponse(ok=True, context_node=ctx, context=ctx_meta, predictions=preds)  # type: ignore
+    return PredictResponse(ok=True, context_node=ctx, context=ctx_meta, predictions=preds)
 
 
 @app.post("/api/execute", response_model=ExecuteResponse)
@@ -295,11 +318,7 @@ async def execute(req: ExecuteRequest):
         return ExecuteResponse(ok=False, error="No active session")
 
     # find action by id (recent window)
-    action: Action | None = None
-    for a in reversed(store.actions):
-        if a.id == req.action_id:
-            action = a
-            break
+    action: Action | None = store.actions_by_id.get(req.action_id)
 
     if not action:
         return ExecuteResponse(ok=False, error="Action not found")
@@ -313,6 +332,7 @@ async def execute(req: ExecuteRequest):
 
 @app.get("/api/memory/search", response_model=MemorySearchResponse)
 async def memory_search(q: str = ""):
+    store.memory.flush()
     results = store.memory.search(q, limit=10)
     return MemorySearchResponse(ok=True, results=results)  # type: ignore
 
@@ -1,41 +1,162 @@
 from __future__ import annotations
+import asyncio
+import functools
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Dict, List
-import time
+from typing import Deque, Dict, List, Optional, Set, Tuple
+import heapq
 import re
 
+from .clock import now_ms
 
-def now_ms() -> int:
-    return int(time.time() * 1000)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Staged hints are folded into the searchable items at most once per interval.
+FLUSH_INTERVAL_S = 1.0
+
+
+@functools.lru_cache(maxsize=4096)
+def _tokens(s: str) -> frozenset[str]:
+    # Hint titles/labels repeat heavily, so tokenizing is memoized per string.
+    return frozenset(_TOKEN_RE.findall(s.lower()))
 
 
 def compact_whitespace(s: str) -> str:
-    return re.sub(r"\s+", " ", s).strip()
+    if not s:
+        return ""
+    if s.isprintable() and "  " not in s:
+        return s.strip()
+    # split()/join run in C and are cheaper than a regex substitution.
+    return " ".join(s.split())
 
 
 @dataclass
 class MemoryStore:
     # Minimal searchable memory: store "procedures" discovered from repeated edges and recent sequences.
     items: Dict[str, dict] = field(default_factory=dict)
+    # Inverted index: token -> ids of items containing it, plus each item's tokens
+    # so an upsert can retract postings that no longer apply.
+    _tok_index: Dict[str, Set[str]] = field(default_factory=dict, repr=False)
+    _item_toks: Dict[str, frozenset] = field(default_factory=dict, repr=False)
+    # Insertion sequence per item id: ranks tied scores in insertion order.
+    _seq: Dict[str, int] = field(default_factory=dict, repr=False)
+    # Lowercased "title text" per item, matched against queries.
+    _hay: Dict[str, str] = field(default_factory=dict, repr=False)
+    # Partial query token -> indexed tokens containing it; kept in step with the vocabulary.
+    _expansions: Dict[str, List[str]] = field(default_factory=dict, repr=False)
+    # Hints staged from the per-event path; folded into `items` by flush().
+    _staged: Deque[Tuple[str, str, str, Optional[List[str]]]] = field(
+        default_factory=lambda: deque(maxlen=64), repr=False
+    )
+    _flush_task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def stage(self, item_id: str, title: str, text: str, tags: List[str] | None = None) -> None:
+        """Queue a hint for the next scheduled flush (must run on the event loop)."""
+        self._staged.append((item_id, title, text, tags))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(FLUSH_INTERVAL_S)
+        self._flush_task = None
+        self.flush()
+
+    def cancel_flush(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+    def flush(self) -> None:
+        # Only the newest staged hint per id survives.
+        latest = {rec[0]: rec for rec in self._staged}
+        self._staged.clear()
+        for rec in latest.values():
+            self.upsert(*rec)
 
     def upsert(self, item_id: str, title: str, text: str, tags: List[str] | None = None) -> None:
-        self.items[item_id] = {
+        it = {
             "id": item_id,
             "title": compact_whitespace(title)[:120],
             "text": compact_whitespace(text)[:2000],
             "updated_at": now_ms(),
             "tags": tags or [],
         }
+        prev = self.items.get(item_id)
+        self.items[item_id] = it
+        if prev is None:
+            self._seq[item_id] = len(self._seq)
+        elif prev["title"] == it["title"] and prev["text"] == it["text"]:
+            return
+        self._hay[item_id] = (it["title"] + " " + it["text"]).lower()
+
+        toks = _tokens(it["title"]) | _tokens(it["text"])
+        old = self._item_toks.get(item_id, frozenset())
+        index = self._tok_index
+        for tok in old - toks:
+            ids = index[tok]
+            ids.discard(item_id)
+            if not ids:
+                del index[tok]
+                for qt, matches in self._expansions.items():
+                    if qt in tok:
+                        matches.remove(tok)
+        for tok in toks - old:
+            ids = index.get(tok)
+            if ids is None:
+                index[tok] = {item_id}
+                for qt, matches in self._expansions.items():
+                    if qt in tok:
+                        matches.append(tok)
+            else:
+                ids.add(item_id)
+        self._item_toks[item_id] = toks
+
+    def _expand(self, qt: str) -> List[str]:
+        """Indexed tokens containing the partial token `qt` (vocabulary scan, then cached)."""
+        matches = self._expansions.get(qt)
+        if matches is None:
+            if len(self._expansions) >= 256:
+                self._expansions.clear()
+            matches = self._expansions[qt] = [tok for tok in self._tok_index if qt in tok]
+        return matches
+
+    def _candidates(self, qn: str) -> Optional[Set[str]]:
+        """Ids that can contain `qn`, or None when the query has no word tokens.
+
+        Any substring match of `qn` puts each of its word tokens inside some
+        indexed token. Whole tokens are looked up directly; a token that is not
+        in the index can only match inside longer tokens.
+        """
+        cands: Optional[Set[str]] = None
+        for qt in _tokens(qn):
+            ids = self._tok_index.get(qt)
+            expanded = [tok for tok in self._expand(qt) if tok != qt]
+            if expanded:
+                ids = set(ids) if ids else set()
+                for tok in expanded:
+                    ids |= self._tok_index[tok]
+            if not ids:
+                return set()
+            cands = ids if cands is None else cands & ids
+            if not cands:
+                return cands
+        return cands
 
     def search(self, q: str, limit: int = 10) -> List[dict]:
         qn = q.lower().strip()
         if not qn:
             return []
+        cands = self._candidates(qn)
+        if cands is None or len(cands) == len(self.items):
+            ids = self.items.keys()
+        else:
+            # Insertion order (not set order) so tied scores rank stably.
+            ids = sorted(cands, key=self._seq.__getitem__)
+        items, hay = self.items, self._hay
         scored = []
-        for it in self.items.values():
-            hay = (it["title"] + " " + it["text"]).lower()
-            score = hay.count(qn)
+        for iid in ids:
+            score = hay[iid].count(qn)
             if score > 0:
-                scored.append((score, it))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [it for _, it in scored[:limit]]
+                scored.append((score, items[iid]))
+        return [it for _, it in heapq.nlargest(limit, scored, key=lambda x: x[0])]
@@ -1,25 +1,27 @@
 from __future__ import annotations
+from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import Dict, Tuple, List
+from operator import itemgetter
+from typing import DefaultDict, Tuple, List
+import heapq
 
 
 @dataclass
 class MarkovPredictor:
     # transitions[(a,b)] = count
-    transitions: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    transitions: DefaultDict[Tuple[str, str], int] = field(default_factory=lambda: defaultdict(int))
     # outgoing[a] = total outgoing count
-    outgoing: Dict[str, int] = field(default_factory=dict)
+    outgoing: DefaultDict[str, int] = field(default_factory=lambda: defaultdict(int))
+    # out_adj[a][b] = count (per-source index so top_k only touches a's edges)
+    out_adj: DefaultDict[str, DefaultDict[str, int]] = field(
+        default_factory=lambda: defaultdict(lambda: defaultdict(int))
+    )
 
     def observe(self, a: str, b: str) -> None:
-        key = (a, b)
-        self.transitions[key] = self.transitions.get(key, 0) + 1
-        self.outgoing[a] = self.outgoing.get(a, 0) + 1
+        self.transitions[(a, b)] += 1
+        self.outgoing[a] += 1
+        self.out_adj[a][b] += 1
 
     def top_k(self, a: str, k: int = 5) -> List[Tuple[str, int]]:
         # returns [(b, count)]
-        cands: List[Tuple[str, int]] = []
-        for (frm, to), cnt in self.transitions.items():
-            if frm == a:
-                cands.append((to, cnt))
-        cands.sort(key=lambda x: x[1], reverse=True)
-        return cands[:k]
+        return heapq.nlargest(k, self.out_adj.get(a, {}).items(), key=itemgetter(1))
@@ -1,20 +1,17 @@
 from __future__ import annotations
 
 import asyncio
-import time
+import re
 import uuid
 from typing import Optional, Callable, Any
 
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 
-from ..schemas import RawEvent, Action
+from ..clock import now_ms
+from ..schemas import EVENT_TYPES, RawEvent, Action
 from .sanitize import scrub_text, safe_host, safe_path, normalize_combo
 
 
-def now_ms() -> int:
-    return int(time.time() * 1000)
-
-
 INJECTED_SCRIPT = r"""
 (() => {
   const now = () => Date.now();
@@ -300,7 +297,24 @@ INJECTED_SCRIPT = r"""
 """
 
 
+def _strip_js(src: str) -> str:
+    """Drop // comments, indentation and blank lines; newlines stay so ASI still holds.
+
+    Only whitespace-preceded `//` is treated as a comment, which is safe for the
+    script above (no string or regex literal contains " //").
+    """
+    out = []
+    for line in src.splitlines():
+        line = re.sub(r"(^|\s+)//.*$", "", line).strip()
+        if line:
+            out.append(line)
+    return "\n".join(out)
+
+
 class PlaywrightAgent:
+    # Sent over CDP for every page init; stripped once at import.
+    INJECTED_SCRIPT_MIN = _strip_js(INJECTED_SCRIPT)
+
     def __init__(
         self,
         dom_mutation_sample_ms: int,
@@ -321,9 +335,17 @@ class PlaywrightAgent:
         self._bridge_lock = asyncio.Lock()
         self._bridged_pages: set[int] = set()
 
+        # Events arrive in same-url bursts; remember the last verdict.
+        self._last_url: Optional[str] = None
+        self._last_host_allowed = False
+
     def _host_allowed(self, url: str) -> bool:
-        h = safe_host(url)
-        return h in self.allowed_hosts
+        if url == self._last_url:
+            return self._last_host_allowed
+        allowed = safe_host(url) in self.allowed_hosts
+        self._last_url = url
+        self._last_host_allowed = allowed
+        return allowed
 
     async def start(self, url: str) -> str:
         if not self._host_allowed(url):
@@ -337,7 +359,7 @@ class PlaywrightAgent:
 
         # Ensure init scripts are installed for ALL pages (recommended)
         await self.context.add_init_script(f"window.__wgr_dom_ms = {int(self.dom_mutation_sample_ms)};")
-        await self.context.add_init_script(INJECTED_SCRIPT)
+        await self.context.add_init_script(self.INJECTED_SCRIPT_MIN)
 
         # Create initial page + bridge it first.
         self.page = await self.context.new_page()
@@ -386,11 +408,12 @@ class PlaywrightAgent:
             self._bridged_pages.clear()
 
     async def _emit_backend(self, typ: str, payload: dict) -> None:
-        ev = RawEvent(
+        # Built from our own trusted values: skip validation.
+        ev = RawEvent.model_construct(
             v=1,
             ts=now_ms(),
             source="backend",
-            type=typ,  # type: ignore
+            type=typ,
             url=self.page.url if self.page else "",
             title=None,
             payload=payload,
@@ -415,20 +438,23 @@ class PlaywrightAgent:
 
         async def _emit_binding(source, payload):
             try:
-                ev = RawEvent(**payload)
+                ev = RawEvent.model_validate(payload)
             except Exception:
                 return
+            if ev.type not in EVENT_TYPES or not isinstance(ev.payload, dict):
+                return
 
             if ev.url and not self._host_allowed(ev.url):
                 return
 
             if ev.type == "POINTER_DOWN":
                 p = ev.payload
-                p["ariaLabel"] = scrub_text(str(p.get("ariaLabel") or ""))
-                p["testid"] = scrub_text(str(p.get("testid") or ""))
-                p["id"] = scrub_text(str(p.get("id") or ""))
-                sel = str(p.get("selector") or "")
-                p["selector"] = sel[:240] if sel else None
+                # Most clicks carry no testid/aria-label/id: skip scrubbing empties.
+                for k in ("ariaLabel", "testid", "id"):
+                    v = p.get(k)
+                    p[k] = scrub_text(str(v)) if v else ""
+                sel = p.get("selector")
+                p["selector"] = str(sel)[:240] if sel else None
 
             if ev.type == "KEY_SHORTCUT":
                 ev.payload["combo"] = scrub_text(str(ev.payload.get("combo") or ""), max_len=32)
@@ -437,14 +463,12 @@ class PlaywrightAgent:
 
         await page.expose_binding("__wgr_emit", _emit_binding)
 
-        page.on(
-            "framenavigated",
-            lambda frame: asyncio.create_task(
-                self._emit_backend("NAV_COMMITTED", {"url": frame.url})
-                if frame == page.main_frame
-                else asyncio.sleep(0)
-            ),
-        )
+        # Filter subframe navigations before creating a task (SPA pages fire many).
+        def _on_nav(frame) -> None:
+            if frame is page.main_frame:
+                asyncio.create_task(self._emit_backend("NAV_COMMITTED", {"url": frame.url}))
+
+        page.on("framenavigated", _on_nav)
 
     async def execute(self, action: Action) -> None:
         if not self.page:
@@ -1,32 +1,42 @@
 from __future__ import annotations
+import functools
 import re
+from urllib.parse import urlparse
 
-EMAIL_RE = re.compile(r"\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b", re.I)
-LONG_NUM_RE = re.compile(r"\b\d{6,}\b")
+# Emails and long numbers are redacted in a single pass.
+REDACT_RE = re.compile(
+    r"(?P<em>\b[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}\b)|(?P<num>\b\d{6,}\b)",
+    re.I,
+)
+_WS_RE = re.compile(r"\s+")
+
+
+def _redact(m: re.Match) -> str:
+    return "[redacted-email]" if m.lastgroup == "em" else "[redacted-number]"
 
 def scrub_text(s: str, max_len: int = 64) -> str:
     if not s:
         return ""
-    s = s.strip()
-    s = EMAIL_RE.sub("[redacted-email]", s)
-    s = LONG_NUM_RE.sub("[redacted-number]", s)
-    s = re.sub(r"\s+", " ", s)
+    s = REDACT_RE.sub(_redact, s.strip())
+    # Only single ASCII spaces left: nothing for the whitespace pass to collapse.
+    if not s.isprintable() or "  " in s:
+        s = _WS_RE.sub(" ", s)
     return s[:max_len]
 
-def safe_host(url: str) -> str:
+@functools.lru_cache(maxsize=4096)
+def safe_host_path(url: str) -> tuple[str, str]:
+    """Parse once per distinct url; events in a session mostly share a handful of urls."""
     try:
-        from urllib.parse import urlparse
-        return urlparse(url).netloc
+        parts = urlparse(url)
+        return parts.netloc, parts.path or "/"
     except Exception:
-        return ""
+        return "", "/"
+
+def safe_host(url: str) -> str:
+    return safe_host_path(url)[0]
 
 def safe_path(url: str) -> str:
-    try:
-        from urllib.parse import urlparse
-        p = urlparse(url).path or "/"
-        return p
-    except Exception:
-        return "/"
+    return safe_host_path(url)[1]
 
 def normalize_combo(combo: str) -> str:
     # injected script sends: Ctrl+Shift+K etc
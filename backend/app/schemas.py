@@ -1,48 +1,64 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
-from typing import Any, Literal, Optional
-
-
-EventType = Literal[
-    "PAGE_READY",
-    "POINTER_DOWN",
-    "KEY_SHORTCUT",
-    "KEY_DOWN",
-    "URL_CHANGED",
-    "NAV_COMMITTED",
-    "TAB_CREATED",
-    "TAB_CLOSED",
-    "DOM_MUTATION",
-    "STATE_SNAPSHOT",
-]
-
-ActionKind = Literal[
-    "CLICK",
-    "SHORTCUT",
-    "KEYBOARD",
-    "MOUSE",
-    "NAV",
-    "TAB",
-    "DOM",
-    "STATE",
-    "OTHER",
-]
-
-
-class RawEvent(BaseModel):
+from dataclasses import dataclass
+from pydantic import BaseModel, ConfigDict, Field, SkipValidation
+from typing import Any, Final, Literal, Optional
+
+
+# Membership sets instead of Literal field types: Pydantic would otherwise run a
+# per-field validator on every event. Checked once where it matters (ingest,
+# AppStore.append_action).
+EVENT_TYPES: Final = frozenset(
+    {
+        "PAGE_READY",
+        "POINTER_DOWN",
+        "KEY_SHORTCUT",
+        "KEY_DOWN",
+        "URL_CHANGED",
+        "NAV_COMMITTED",
+        "TAB_CREATED",
+        "TAB_CLOSED",
+        "DOM_MUTATION",
+        "STATE_SNAPSHOT",
+    }
+)
+
+ACTION_KINDS: Final = frozenset(
+    {
+        "CLICK",
+        "SHORTCUT",
+        "KEYBOARD",
+        "MOUSE",
+        "NAV",
+        "TAB",
+        "DOM",
+        "STATE",
+        "OTHER",
+    }
+)
+
+
+class _Schema(BaseModel):
+    # Static DTOs: never re-validate instances we hand back in (e.g. GraphNode inside
+    # PredictResponse), no assignment validation, unknown keys dropped.
+    model_config = ConfigDict(validate_assignment=False, revalidate_instances="never", extra="ignore")
+
+
+class RawEvent(_Schema):
     v: int = 1
     ts: int
     source: Literal["injected", "backend"]
-    type: EventType
+    type: str  # one of EVENT_TYPES
     url: str = ""
     title: Optional[str] = None
-    payload: dict[str, Any] = Field(default_factory=dict)
+    # Arbitrary injected structure that consumers read a few keys from: taken as-is
+    # instead of being walked and copied on every event (type checked at ingest).
+    payload: SkipValidation[dict[str, Any]] = Field(default_factory=dict)
 
 
-class Action(BaseModel):
+class Action(_Schema):
     id: str
     ts: int
-    kind: ActionKind
+    kind: str  # one of ACTION_KINDS
     url: str
     host: str
     path: str
@@ -50,14 +66,16 @@ class Action(BaseModel):
     payload: dict[str, Any] = Field(default_factory=dict)
 
 
-class GraphNode(BaseModel):
+class GraphNode(_Schema):
     id: str
     label: str
-    kind: ActionKind
+    kind: str  # one of ACTION_KINDS
     count: int = 0
 
 
-class GraphEdge(BaseModel):
+class GraphEdge(_Schema):
+    model_config = ConfigDict(populate_by_name=True)
+
     frm: str = Field(alias="from")
     to: str
     count: int
@@ -65,51 +83,58 @@ class GraphEdge(BaseModel):
     avg_ms: int
 
 
-class GraphSnapshot(BaseModel):
+class GraphSnapshot(_Schema):
     v: int = 1
     generated_at: int
     nodes: list[GraphNode]
     edges: list[GraphEdge]
 
 
-class StartSessionRequest(BaseModel):
+class StartSessionRequest(_Schema):
     url: str
 
 
-class StartSessionResponse(BaseModel):
+# Server-built responses: plain dataclasses (no input to validate), rendered by
+# the app's orjson default_response_class.
+@dataclass(slots=True)
+class StartSessionResponse:
     ok: bool
     session_id: Optional[str] = None
 
 
-class StopSessionResponse(BaseModel):
+@dataclass(slots=True)
+class StopSessionResponse:
     ok: bool
 
 
-class StateResponse(BaseModel):
+@dataclass(slots=True)
+class StateResponse:
     recording: bool
     session_id: Optional[str]
     allowed_hosts: list[str]
 
 
-class PredictResponse(BaseModel):
+@dataclass(slots=True)
+class PredictResponse:
     ok: bool
     # The node used as the prediction context (workflow-only; DOM/TAB excluded).
     context_node: Optional[str]
+    predictions: list[GraphNode]
     # Full metadata for the context node (for UI display).
     context: Optional[GraphNode] = None
-    predictions: list[GraphNode]
 
 
-class ExecuteRequest(BaseModel):
+class ExecuteRequest(_Schema):
     action_id: str
 
 
-class ExecuteResponse(BaseModel):
+@dataclass(slots=True)
+class ExecuteResponse:
     ok: bool
     error: Optional[str] = None
 
 
-class MemoryItem(BaseModel):
+class MemoryItem(_Schema):
     id: str
     title: str
     text: str
@@ -117,6 +142,6 @@ class MemoryItem(BaseModel):
     tags: list[str] = Field(default_factory=list)
 
 
-class MemorySearchResponse(BaseModel):
+class MemorySearchResponse(_Schema):
     ok: bool
     results: list[MemoryItem]
\ No newline at end of file
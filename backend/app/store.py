@@ -1,22 +1,21 @@
 from __future__ import annotations
 import asyncio
-import time
-from typing import Optional, List, Dict
+from collections import deque
+from typing import Deque, Optional, List, Dict, Tuple
 
-from .schemas import RawEvent, Action
+from .schemas import ACTION_KINDS, RawEvent, Action, GraphNode
 from .graph import GraphState
 from .predictor import MarkovPredictor
 from .memory import MemoryStore
+from .clock import now_ms
 
-
-def now_ms() -> int:
-    return int(time.time() * 1000)
+__all__ = ["AppStore"]
 
 
 # Actions that represent user-intended workflow steps.
 # Context events (DOM/TAB/OTHER) are still recorded as nodes, but they should not
 # become transition parents nor prediction context.
-WORKFLOW_KINDS = {"CLICK", "SHORTCUT", "NAV"}
+WORKFLOW_KINDS = frozenset({"CLICK", "SHORTCUT", "NAV"})
 
 # "STATE" is an explicit snapshot of the UI's current affordances.
 # It should be the *primary* parent for subsequent workflow actions.
@@ -28,24 +27,56 @@ def _state_scoped_id(prefix: str, state_id: str) -> str:
     return f"{prefix}@{state_id}"
 
 
-def is_workflow_kind(kind: str) -> bool:
-    return kind in WORKFLOW_KINDS
-
-
 class AppStore:
+    # Touched on every event: slots make attribute access fixed-offset loads.
+    __slots__ = (
+        "_lock",
+        "max_events",
+        "recording",
+        "session_id",
+        "events",
+        "actions",
+        "actions_by_id",
+        "graph",
+        "predictor",
+        "memory",
+        "_predict_cache",
+        "_snapshot",
+        "_snapshot_version",
+        "_last_action_id",
+        "_last_action_ts",
+        "_last_workflow_action_id",
+        "_last_workflow_action_ts",
+        "_last_state_id",
+        "_last_state_ts",
+        "_await_post_state_action_id",
+        "_await_post_state_action_ts",
+        "agent",
+    )
+
     def __init__(self, max_events: int = 20_000):
+        # Methods without an await inside run atomically on the event loop, so they
+        # don't take the lock; it only guards the multi-field set_recording/clear.
         self._lock = asyncio.Lock()
         self.max_events = max_events
 
         self.recording: bool = False
         self.session_id: Optional[str] = None
 
-        self.events: List[RawEvent] = []
-        self.actions: List[Action] = []
+        # Bounded rings: appends past max_events evict the oldest entry in O(1).
+        self.events: Deque[RawEvent] = deque(maxlen=max_events)
+        self.actions: Deque[Action] = deque(maxlen=max_events)
+        # Latest retained action per id (execute looks actions up by node id).
+        self.actions_by_id: Dict[str, Action] = {}
 
         self.graph = GraphState()
         self.predictor = MarkovPredictor()
         self.memory = MemoryStore()
+        # predict_next results per (context, k); cleared whenever the predictor observes.
+        self._predict_cache: Dict[Tuple[str, int], List[GraphNode]] = {}
+        # Last graph snapshot and the graph version it was built from.
+        self._snapshot: Optional[dict] = None
+        self._snapshot_version = -1
 
         self._last_action_id: Optional[str] = None
         self._last_action_ts: Optional[int] = None
@@ -71,167 +102,178 @@ class AppStore:
             self.session_id = session_id
 
     async def append_event(self, ev: RawEvent) -> None:
-        async with self._lock:
-            self.events.append(ev)
-            if len(self.events) > self.max_events:
-                self.events = self.events[-self.max_events :]
+        self.events.append(ev)
 
     async def append_action(self, act: Action) -> None:
-        async with self._lock:
-            self.actions.append(act)
-            if len(self.actions) > self.max_events:
-                self.actions = self.actions[-self.max_events :]
-
-            # --- Context aggregation per STATE ---
-            last_state_id = self._last_state_id
-            last_state_ts = self._last_state_ts
-
-            def touch_state_scoped(kind: str, label: str) -> Optional[str]:
-                if not last_state_id:
-                    return None
-                nid = _state_scoped_id(kind, last_state_id)
-                self.graph.touch_node(nid, label, kind)
-                if last_state_ts is not None:
-                    dt = max(0, act.ts - last_state_ts)
-                    self.graph.add_edge(last_state_id, nid, dt)
-                return nid
-
-            # DOM mutations: aggregate per state.
-            if act.kind == "DOM":
-                touch_state_scoped("DOM", act.label)
-
-                self._last_action_id = act.id
-                self._last_action_ts = act.ts
-                return
-
-            # CLICK: add per-state "mouse input" node.
-            if act.kind == "CLICK":
-                touch_state_scoped("MOUSE", f"Mouse input\n{act.host}{act.path}")
-
-            # SHORTCUT: add per-state "keyboard input" node.
-            if act.kind == "SHORTCUT":
-                touch_state_scoped("KEYBOARD", f"Keyboard input\n{act.host}{act.path}")
-
-            # Plain KEYBOARD events: aggregate per state (no per-key nodes).
-            if act.kind == "KEYBOARD":
-                touch_state_scoped("KEYBOARD", f"Keyboard input\n{act.host}{act.path}")
-
-                self._last_action_id = act.id
-                self._last_action_ts = act.ts
-                return
-
-            # Always track the actual action node (including TAB/CLICK/NAV/etc).
-            self.graph.touch_node(act.id, act.label, act.kind)
-
-            # TAB events: connect from current STATE so tab changes are not isolated.
-            if act.kind == "TAB":
-                if last_state_id is not None and last_state_ts is not None:
-                    dt = max(0, act.ts - last_state_ts)
-                    self.graph.add_edge(last_state_id, act.id, dt)
-
-            # STATE snapshots: update state context and (optionally) connect the
-            # most recent workflow action to the post-action state.
-            if act.kind == STATE_KIND:
-                if (
-                    self._await_post_state_action_id is not None
-                    and self._await_post_state_action_ts is not None
-                    and act.ts >= self._await_post_state_action_ts
-                ):
-                    dt = act.ts - self._await_post_state_action_ts
-                    self.graph.add_edge(self._await_post_state_action_id, act.id, dt)
-                    self._await_post_state_action_id = None
-                    self._await_post_state_action_ts = None
-
-                self._last_state_id = act.id
-                self._last_state_ts = act.ts
-
-                # Keep raw last action for debugging/timelines.
-                self._last_action_id = act.id
-                self._last_action_ts = act.ts
-                return
-
-            # Workflow actions: prefer STATE -> ACTION transitions. This prevents
-            # "Go back -> Pick Beta"-style edges when the user returns to an
-            # earlier screen: the *state* becomes the parent, not the last button.
-            if is_workflow_kind(act.kind):
-                if self._last_state_id is not None and self._last_state_ts is not None:
-                    dt = act.ts - self._last_state_ts
-                    self.graph.add_edge(self._last_state_id, act.id, dt)
-                    self.predictor.observe(self._last_state_id, act.id)
-                elif self._last_workflow_action_id is not None and self._last_workflow_action_ts is not None:
-                    # Fallback if no state snapshots exist yet.
-                    dt = act.ts - self._last_workflow_action_ts
-                    self.graph.add_edge(self._last_workflow_action_id, act.id, dt)
-                    self.predictor.observe(self._last_workflow_action_id, act.id)
-
-                self._last_workflow_action_id = act.id
-                self._last_workflow_action_ts = act.ts
-
-                # Pair this action with the next observed post-action STATE snapshot.
-                self._await_post_state_action_id = act.id
-                self._await_post_state_action_ts = act.ts
-
-            # Keep raw last action for debugging/timelines.
-            self._last_action_id = act.id
-            self._last_action_ts = act.ts
+        # Actions arrive via model_construct (no validation): reject unknown kinds
+        # before anything is recorded.
+        kind = act.kind
+        if kind not in ACTION_KINDS:
+            raise ValueError(f"Unknown action kind: {kind!r}")
+
+        if len(self.actions) == self.max_events:
+            old = self.actions[0]
+            if self.actions_by_id.get(old.id) is old:
+                del self.actions_by_id[old.id]
+        self.actions.append(act)
+        self.actions_by_id[act.id] = act
+
+        # Hot path: bind everything read more than once to locals up front.
+        ts = act.ts
+        aid = act.id
+        graph = self.graph
+        last_state_id = self._last_state_id
+        last_state_ts = self._last_state_ts
+
+        # Keep raw last action for debugging/timelines.
+        self._last_action_id = aid
+        self._last_action_ts = ts
+
+        # --- Context aggregation per STATE ---
+        def touch_state_scoped(scope: str, label: str) -> Optional[str]:
+            if not last_state_id:
+                return None
+            nid = _state_scoped_id(scope, last_state_id)
+            graph.touch_node(nid, label, scope)
+            if last_state_ts is not None:
+                graph.add_edge(last_state_id, nid, max(0, ts - last_state_ts))
+            return nid
+
+        # DOM mutations: aggregate per state.
+        if kind == "DOM":
+            touch_state_scoped("DOM", act.label)
+            return
+
+        # CLICK: add per-state "mouse input" node.
+        if kind == "CLICK":
+            touch_state_scoped("MOUSE", f"Mouse input\n{act.host}{act.path}")
+
+        # SHORTCUT: add per-state "keyboard input" node.
+        elif kind == "SHORTCUT":
+            touch_state_scoped("KEYBOARD", f"Keyboard input\n{act.host}{act.path}")
+
+        # Plain KEYBOARD events: aggregate per state (no per-key nodes).
+        elif kind == "KEYBOARD":
+            touch_state_scoped("KEYBOARD", f"Keyboard input\n{act.host}{act.path}")
+            return
+
+        # Always track the actual action node (including TAB/CLICK/NAV/etc).
+        graph.touch_node(aid, act.label, kind)
+
+        # TAB events: connect from current STATE so tab changes are not isolated.
+        if kind == "TAB":
+            if last_state_id is not None and last_state_ts is not None:
+                graph.add_edge(last_state_id, aid, max(0, ts - last_state_ts))
+
+        # STATE snapshots: update state context and (optionally) connect the
+        # most recent workflow action to the post-action state.
+        if kind == STATE_KIND:
+            await_id = self._await_post_state_action_id
+            await_ts = self._await_post_state_action_ts
+            if await_id is not None and await_ts is not None and ts >= await_ts:
+                graph.add_edge(await_id, aid, ts - await_ts)
+                self._await_post_state_action_id = None
+                self._await_post_state_action_ts = None
+
+            self._last_state_id = aid
+            self._last_state_ts = ts
+            return
+
+        # Workflow actions: prefer STATE -> ACTION transitions. This prevents
+        # "Go back -> Pick Beta"-style edges when the user returns to an
+        # earlier screen: the *state* becomes the parent, not the last button.
+        # Exactly one parent edge per workflow action.
+        if kind in WORKFLOW_KINDS:
+            parent: Optional[str] = None
+            dt = 0
+            if last_state_id is not None and last_state_ts is not None:
+                parent, dt = last_state_id, ts - last_state_ts
+            else:
+                # Fallback if no state snapshots exist yet.
+                lw_id, lw_ts = self._last_workflow_action_id, self._last_workflow_action_ts
+                if lw_id is not None and lw_ts is not None:
+                    parent, dt = lw_id, ts - lw_ts
+            if parent is not None:
+                graph.add_edge(parent, aid, dt)
+                self.predictor.observe(parent, aid)
+                self._predict_cache.clear()
+
+            self._last_workflow_action_id = aid
+            self._last_workflow_action_ts = ts
+
+            # Pair this action with the next observed post-action STATE snapshot.
+            self._await_post_state_action_id = aid
+            self._await_post_state_action_ts = ts
 
 
     async def snapshot_graph(self) -> dict:
-        async with self._lock:
-            return self.graph.snapshot(now_ms())
+        ts = now_ms()
+        if self._snapshot is not None and self._snapshot_version == self.graph.version:
+            snap = dict(self._snapshot)
+            snap["generated_at"] = ts
+            return snap
+        self._snapshot = self.graph.snapshot(ts)
+        self._snapshot_version = self.graph.version
+        return self._snapshot
 
     async def get_last_action_id(self) -> Optional[str]:
-        async with self._lock:
-            return self._last_action_id
+        return self._last_action_id
 
     async def get_last_workflow_action_id(self) -> Optional[str]:
-        async with self._lock:
-            return self._last_workflow_action_id
+        return self._last_workflow_action_id
 
     async def get_last_state_id(self) -> Optional[str]:
-        async with self._lock:
-            return self._last_state_id
+        return self._last_state_id
 
     async def reset_context(self) -> None:
         """Reset per-session context pointers so edges never cross sessions."""
-        async with self._lock:
-            self._last_action_id = None
-            self._last_action_ts = None
-            self._last_workflow_action_id = None
-            self._last_workflow_action_ts = None
-            self._last_state_id = None
-            self._last_state_ts = None
-            self._await_post_state_action_id = None
-            self._await_post_state_action_ts = None
-
-    async def get_node_meta(self, node_id: str) -> Optional[dict]:
-        async with self._lock:
-            if node_id not in self.graph.node_meta:
-                return None
-            label, kind = self.graph.node_meta[node_id]
-            return {"id": node_id, "label": label, "kind": kind, "count": self.graph.node_counts.get(node_id, 0)}
-
-    async def predict_next(self, k: int = 5) -> List[dict]:
-        async with self._lock:
-            # Prefer state-context prediction; fall back to workflow context if
-            # snapshots are not available.
-            ctx = self._last_state_id or self._last_workflow_action_id
-            if not ctx:
-                return []
-            top = self.predictor.top_k(ctx, k=k)
-            out = []
-            for nid, cnt in top:
-                label, kind = self.graph.node_meta.get(nid, (nid, "OTHER"))
-                out.append({"id": nid, "label": label, "kind": kind, "count": cnt})
-            return out
+        self._last_action_id = None
+        self._last_action_ts = None
+        self._last_workflow_action_id = None
+        self._last_workflow_action_ts = None
+        self._last_state_id = None
+        self._last_state_ts = None
+        self._await_post_state_action_id = None
+        self._await_post_state_action_ts = None
+
+    async def get_node_meta(self, node_id: str) -> Optional[GraphNode]:
+        if node_id not in self.graph.node_meta:
+            return None
+        label, kind = self.graph.node_meta[node_id]
+        return GraphNode.model_construct(
+            id=node_id, label=label, kind=kind, count=self.graph.node_counts.get(node_id, 0)
+        )
+
+    async def predict_next(self, k: int = 5) -> List[GraphNode]:
+        # Prefer state-context prediction; fall back to workflow context if
+        # snapshots are not available.
+        ctx = self._last_state_id or self._last_workflow_action_id
+        if not ctx:
+            return []
+        key = (ctx, k)
+        cached = self._predict_cache.get(key)
+        if cached is not None:
+            return cached
+        top = self.predictor.top_k(ctx, k=k)
+        out = []
+        for nid, cnt in top:
+            label, kind = self.graph.node_meta.get(nid, (nid, "OTHER"))
+            # Built from our own graph state: no validation needed.
+            out.append(GraphNode.model_construct(id=nid, label=label, kind=kind, count=cnt))
+        self._predict_cache[key] = out
+        return out
 
     async def clear(self) -> None:
         async with self._lock:
             self.events.clear()
             self.actions.clear()
+            self.actions_by_id.clear()
             self.graph = GraphState()
             self.predictor = MarkovPredictor()
+            self.memory.cancel_flush()
             self.memory = MemoryStore()
+            self._predict_cache.clear()
+            self._snapshot = None
             self._last_action_id = None
             self._last_action_ts = None
             self._last_workflow_action_id = None
@@ -1,34 +1,55 @@
 from __future__ import annotations
 from fastapi import WebSocket
 import asyncio
+import orjson
+from typing import Optional
+
+
+# High-rate frames (events/actions) are coalesced into one broadcast per tick.
+BATCH_INTERVAL_S = 0.016
 
 
 class WSManager:
+    __slots__ = ("_clients", "_pending", "_flush_task")
+
     def __init__(self) -> None:
-        self._lock = asyncio.Lock()
-        self._clients: set[WebSocket] = set()
+        # Copy-on-write: writers rebind a new tuple with no await in between, so
+        # every access is atomic on the event loop and broadcasts read a
+        # consistent snapshot with a single attribute load.
+        self._clients: tuple[WebSocket, ...] = ()
+        self._pending: list[dict] = []
+        self._flush_task: Optional[asyncio.Task] = None
 
     async def connect(self, ws: WebSocket) -> None:
         await ws.accept()
-        async with self._lock:
-            self._clients.add(ws)
+        if ws not in self._clients:
+            self._clients = self._clients + (ws,)
 
     async def disconnect(self, ws: WebSocket) -> None:
-        async with self._lock:
-            self._clients.discard(ws)
+        self._clients = tuple(c for c in self._clients if c is not ws)
 
     async def broadcast_json(self, payload: dict) -> None:
-        async with self._lock:
-            clients = list(self._clients)
-
-        dead: list[WebSocket] = []
-        for c in clients:
-            try:
-                await c.send_json(payload)
-            except Exception:
-                dead.append(c)
-
-        if dead:
-            async with self._lock:
-                for d in dead:
-                    self._clients.discard(d)
+        clients = self._clients
+        if not clients:
+            return
+
+        # Encode once with orjson and send to all clients concurrently. Frames stay
+        # text (the frontend JSON.parses ev.data), so decode the bytes once here.
+        data = orjson.dumps(payload).decode()
+        results = await asyncio.gather(*(c.send_text(data) for c in clients), return_exceptions=True)
+        failed = [c for c, r in zip(clients, results) if isinstance(r, Exception)]
+        if failed:
+            # No await between this read and rebind, so no lock is needed.
+            self._clients = tuple(c for c in self._clients if c not in failed)
+
+    def enqueue_json(self, payload: dict) -> None:
+        """Queue a frame for the next batched broadcast ({"type": "batch", "items": [...]})."""
+        self._pending.append(payload)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(BATCH_INTERVAL_S)
+        items, self._pending = self._pending, []
+        self._flush_task = None
+        await self.broadcast_json({"type": "batch", "items": items})
@@ -13,7 +13,14 @@ export function connectWS(onMessage: (data: any) => void): WebSocket {
   const ws = new WebSocket(wsUrl);
 
   ws.onmessage = (ev) => {
-    try { onMessage(JSON.parse(ev.data)); } catch {}
+    let msg: any;
+    try { msg = JSON.parse(ev.data); } catch { return; }
+    // Backend coalesces high-rate frames into { type: "batch", items: [...] };
+    // a throwing handler only drops its own item, not the rest of the batch.
+    const items = msg?.type === "batch" && Array.isArray(msg.items) ? msg.items : [msg];
+    for (const item of items) {
+      try { onMessage(item); } catch {}
+    }
   };
 
   return ws;